@@ -1,8 +1,9 @@
-import json
+import asyncio
+import hashlib
+import logging
 import os
-import re
+from contextlib import aclosing
 from dataclasses import dataclass
-from http.server import BaseHTTPRequestHandler
 from typing import Any, Dict, List
 
 # Load environment variables from .env.local or .env
@@ -10,30 +11,38 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import groq
+import httpx
+import orjson
+from cachetools import TTLCache
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
-from langgraph.graph import END, StateGraph
+
+logger = logging.getLogger(__name__)
 
 
 # -------- Helper: Clean LLM JSON output --------
 def clean_json_str(s: str) -> str:
     """
     Remove markdown code fences (``````), optional 'json' language hint,
-    then strip whitespace, so json.loads() can parse it cleanly.
+    then strip whitespace, so orjson.loads() can parse it cleanly.
     """
     if not isinstance(s, str):
         return ""
     s = s.strip()
-    # Remove opening ```
-    s = re.sub(r"^```(?:json)?\s*", "", s, flags=re.IGNORECASE)
+    # Remove opening ``` and optional 'json' language hint
+    if s.startswith("```"):
+        nl = s.find("\n")
+        s = s[nl + 1 :] if nl != -1 else s[3:]
+        s = s.removeprefix("json").lstrip()
     # Remove closing ```
-    s = re.sub(r"\s*```$", "", s)
-    return s.strip()
+    if s.endswith("```"):
+        s = s[:-3].rstrip()
+    return s
 
 
 # --------- USER PROFILE MODEL ----------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserProfile:
     user_id: str
     age: int
@@ -57,37 +66,116 @@ class FitnessState(dict):
     errors: List[str]
 
 
+# --------- STATIC FALLBACK PLANS ----------
+# Built once at import; the validators copy everything into fresh dicts,
+# so sharing these across requests is safe.
+_FALLBACK_ROUTINES = [
+    {"name": "Push-ups", "sets": 3, "reps": 10},
+    {"name": "Squats", "sets": 3, "reps": 15},
+    {"name": "Plank", "sets": 3, "reps": 30},
+]
+
+_FALLBACK_DIET = {
+    "dailyCalories": 2000,
+    "meals": [
+        {
+            "name": "Breakfast",
+            "foods": ["Oatmeal with berries", "Greek yogurt", "Coffee"],
+        },
+        {
+            "name": "Lunch",
+            "foods": ["Grilled chicken salad", "Brown rice", "Water"],
+        },
+        {
+            "name": "Dinner",
+            "foods": ["Salmon", "Vegetables", "Sweet potato"],
+        },
+    ],
+}
+
+
+def _fallback_workout(schedule: List[str]) -> Dict[str, Any]:
+    return {
+        "schedule": schedule,
+        "exercises": [{"day": day, "routines": _FALLBACK_ROUTINES} for day in schedule],
+    }
+
+
 # --------- MAIN GENERATOR ----------
 class FitnessPlanGenerator:
     def __init__(self):
         groq_key = os.getenv("GROQ_API_KEY")
-        print(
-            "[DEBUG] GROQ_API_KEY loaded:", groq_key[:6] + "..." if groq_key else None
+        # One long-lived pooled client so TCP + TLS handshakes to
+        # api.groq.com are amortized across requests via keep-alive.
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
         )
         self.llm = ChatGroq(
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             groq_api_key=groq_key,
+            http_async_client=self._http,
         )
-        self.graph = self._build_graph()
-
-    def _build_graph(self) -> StateGraph:
-        workflow = StateGraph(FitnessState)
-        workflow.add_node("generate_workout", self.generate_workout_plan)
-        workflow.add_node("generate_diet", self.generate_diet_plan)
-        workflow.add_node("validate_workout", self.validate_workout_plan)
-        workflow.add_node("validate_diet", self.validate_diet_plan)
-        workflow.add_node("finalize_plan", self.finalize_plan)
+        # Static system prompt built once; only the user-specific
+        # HumanMessage is constructed per request.
+        self._plan_system = SystemMessage(
+            content="""
+You are an experienced fitness and nutrition coach creating personalized workout and diet plans.
+CRITICAL SCHEMA INSTRUCTIONS:
+- Your output MUST contain ONLY the fields specified below, NO ADDITIONAL FIELDS
+- "sets" and "reps" MUST ALWAYS be NUMBERS, never strings
+- "dailyCalories" MUST be a NUMBER, not a string
+- Return ONLY a valid JSON object with this EXACT structure:
+{
+  "workout_plan": {
+    "schedule": ["Monday", "Wednesday", "Friday"],
+    "exercises": [
+      {
+        "day": "Monday",
+        "routines": [
+          {
+            "name": "Exercise Name",
+            "sets": 3,
+            "reps": 10
+          }
+        ]
+      }
+    ]
+  },
+  "diet_plan": {
+    "dailyCalories": 2000,
+    "meals": [
+      {
+        "name": "Breakfast",
+        "foods": ["Oatmeal with berries", "Greek yogurt", "Black coffee"]
+      },
+      {
+        "name": "Lunch",
+        "foods": ["Grilled chicken salad", "Whole grain bread", "Water"]
+      }
+    ]
+  }
+}
+"""
+        )
+        # Identical profiles are resubmitted often; caching the finished
+        # plan for an hour skips both Groq round-trips entirely.
+        self._cache = TTLCache(maxsize=10_000, ttl=3600)
+        self._cache_lock = asyncio.Lock()
 
-        workflow.set_entry_point("generate_workout")
-        workflow.add_edge("generate_workout", "generate_diet")
-        workflow.add_edge("generate_diet", "validate_workout")
-        workflow.add_edge("validate_workout", "validate_diet")
-        workflow.add_edge("validate_diet", "finalize_plan")
-        workflow.add_edge("finalize_plan", END)
-        return workflow.compile()
+    # -------- PIPELINE ----------
+    async def _run_pipeline(self, state: FitnessState) -> FitnessState:
+        # The workflow is strictly linear, so a plain call sequence does
+        # the job without graph dispatch or per-node callback overhead.
+        state = await self.generate_both(state)
+        state = await self.validate_workout_plan(state)
+        state = await self.validate_diet_plan(state)
+        state = await self.finalize_plan(state)
+        return state
 
     # -------- FINALIZE ----------
-    def finalize_plan(self, state: FitnessState) -> FitnessState:
+    async def finalize_plan(self, state: FitnessState) -> FitnessState:
         state["final_plan"] = {
             "success": len(state.get("errors", [])) == 0,
             "workout_plan": state.get("validated_workout", {}),
@@ -96,38 +184,56 @@ class FitnessPlanGenerator:
         }
         return state
 
-    # -------- WORKOUT GENERATION ----------
-    def generate_workout_plan(self, state: FitnessState) -> FitnessState:
+    # -------- STREAMING HELPER ----------
+    async def _astream_json(self, messages) -> str:
+        """
+        Stream the LLM response and return the accumulated text as soon as
+        the top-level JSON object closes, instead of waiting for trailing
+        tokens (closing code fence, whitespace) to arrive.
+        """
+        chunks: List[str] = []
+        depth = 0
+        started = False
+        in_string = False
+        escaped = False
+        # aclosing() shuts the stream down on early exit so the pooled
+        # connection is released immediately instead of waiting on GC.
+        async with aclosing(self.llm.astream(messages)) as stream:
+            async for chunk in stream:
+                text = chunk.content
+                if not text:
+                    continue
+                chunks.append(text)
+                # Lightweight brace counter (string-aware) to detect end-of-JSON.
+                for ch in text:
+                    if escaped:
+                        escaped = False
+                    elif in_string:
+                        if ch == "\\":
+                            escaped = True
+                        elif ch == '"':
+                            in_string = False
+                    elif ch == '"':
+                        in_string = True
+                    elif ch == "{":
+                        depth += 1
+                        started = True
+                    elif ch == "}":
+                        depth -= 1
+                if started and depth == 0:
+                    break
+        return "".join(chunks)
+
+    # -------- COMBINED GENERATION ----------
+    async def generate_both(self, state: FitnessState) -> FitnessState:
+        # Both plans share the same user context, so one batched prompt
+        # costs a single Groq round-trip and one set of system tokens.
         user = state["user_profile"]
-        workout_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(
-                    content="""
-You are an experienced fitness coach creating personalized workout plans.
-CRITICAL SCHEMA INSTRUCTIONS:
-- Your output MUST contain ONLY the fields specified below, NO ADDITIONAL FIELDS
-- "sets" and "reps" MUST ALWAYS be NUMBERS, never strings
-- Return ONLY a valid JSON object with this EXACT structure:
-{
-  "schedule": ["Monday", "Wednesday", "Friday"],
-  "exercises": [
-    {
-      "day": "Monday",
-      "routines": [
-        {
-          "name": "Exercise Name",
-          "sets": 3,
-          "reps": 10
-        }
-      ]
-    }
-  ]
-}
-"""
-                ),
-                HumanMessage(
-                    content=f"""
-Create a personalized workout plan based on:
+        plan_messages = [
+            self._plan_system,
+            HumanMessage(
+                content=f"""
+Create a personalized workout plan and diet plan based on:
 Age: {user.age}
 Height: {user.height}
 Weight: {user.weight}
@@ -135,134 +241,65 @@ Injuries or limitations: {user.injuries}
 Available days for workout: {', '.join(user.workout_days)}
 Fitness goal: {user.fitness_goal}
 Fitness level: {user.fitness_level}
+Dietary restrictions: {user.dietary_restrictions}
 """
-                ),
-            ]
+            ),
+        ]
+        try:
+            content = await self._astream_json(plan_messages)
+            # %r is lazy: the multi-KB repr is only built if DEBUG is on.
+            logger.debug("LLM plan raw response: %r", content)
+            cleaned = clean_json_str(content)
+            plan = orjson.loads(cleaned)
+            state["workout_plan"] = plan.get("workout_plan", {})
+            state["diet_plan"] = plan.get("diet_plan", {})
+        except (groq.APIError, httpx.HTTPError, TimeoutError) as e:
+            logger.error("LLM request failed: %s", e)
+            self._apply_generation_fallback(state, user, f"Plan generation error: {e}")
+        except (orjson.JSONDecodeError, ValueError, KeyError) as e:
+            logger.error("LLM response parse failed: %s", e)
+            self._apply_generation_fallback(state, user, f"Plan generation error: {e}")
+        return state
+
+    def _apply_generation_fallback(
+        self, state: FitnessState, user: UserProfile, message: str
+    ) -> None:
+        state.setdefault("errors", []).append(message)
+        schedule = (
+            user.workout_days
+            if isinstance(user.workout_days, list)
+            else [str(user.workout_days)]
         )
+        state["workout_plan"] = _fallback_workout(schedule)
+        state["diet_plan"] = _FALLBACK_DIET
+
+    # -------- WORKOUT VALIDATION ----------
+    async def validate_workout_plan(self, state: FitnessState) -> FitnessState:
         try:
-            response = self.llm.invoke(workout_prompt.format_messages())
-            print("[DEBUG] LLM workout raw response:", repr(response.content))
-            cleaned = clean_json_str(response.content)
-            state["workout_plan"] = json.loads(cleaned)
-        except Exception as e:
-            print("[ERROR] LLM workout exception:", e)
-            state["errors"] = state.get("errors", []) + [
-                f"Workout generation error: {str(e)}"
-            ]
-            schedule = (
-                user.workout_days
-                if isinstance(user.workout_days, list)
-                else [str(user.workout_days)]
-            )
-            state["workout_plan"] = {
-                "schedule": schedule,
+            plan = state["workout_plan"]
+            state["validated_workout"] = {
+                "schedule": plan.get("schedule", []),
                 "exercises": [
                     {
-                        "day": day,
+                        "day": ex.get("day", ""),
                         "routines": [
-                            {"name": "Push-ups", "sets": 3, "reps": 10},
-                            {"name": "Squats", "sets": 3, "reps": 15},
-                            {"name": "Plank", "sets": 3, "reps": 30},
+                            {
+                                "name": r.get("name", "Exercise"),
+                                "sets": int(r.get("sets", 1)),
+                                "reps": int(r.get("reps", 10)),
+                            }
+                            for r in ex.get("routines", [])
                         ],
                     }
-                    for day in schedule
+                    for ex in plan.get("exercises", [])
                 ],
             }
-        return state
-
-    # --------- DIET GENERATION ----------
-    def generate_diet_plan(self, state: FitnessState) -> FitnessState:
-        user = state["user_profile"]
-        diet_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(
-                    content="""
-You are an experienced nutrition coach creating personalized diet plans.
-CRITICAL SCHEMA INSTRUCTIONS:
-- Your output MUST contain ONLY the fields specified below, NO ADDITIONAL FIELDS
-- "dailyCalories" MUST be a NUMBER, not a string
-- Return ONLY a valid JSON object with this EXACT structure:
-{
-  "dailyCalories": 2000,
-  "meals": [
-    {
-      "name": "Breakfast",
-      "foods": ["Oatmeal with berries", "Greek yogurt", "Black coffee"]
-    },
-    {
-      "name": "Lunch",
-      "foods": ["Grilled chicken salad", "Whole grain bread", "Water"]
-    }
-  ]
-}
-"""
-                ),
-                HumanMessage(
-                    content=f"""
-Create a personalized diet plan based on:
-Age: {user.age}
-Height: {user.height}
-Weight: {user.weight}
-Fitness goal: {user.fitness_goal}
-Dietary restrictions: {user.dietary_restrictions}
-"""
-                ),
-            ]
-        )
-        try:
-            response = self.llm.invoke(diet_prompt.format_messages())
-            print("[DEBUG] LLM diet raw response:", repr(response.content))
-            cleaned = clean_json_str(response.content)
-            state["diet_plan"] = json.loads(cleaned)
-        except Exception as e:
-            print("[ERROR] LLM diet exception:", e)
-            state["errors"] = state.get("errors", []) + [
-                f"Diet generation error: {str(e)}"
-            ]
-            state["diet_plan"] = {
-                "dailyCalories": 2000,
-                "meals": [
-                    {
-                        "name": "Breakfast",
-                        "foods": ["Oatmeal with berries", "Greek yogurt", "Coffee"],
-                    },
-                    {
-                        "name": "Lunch",
-                        "foods": ["Grilled chicken salad", "Brown rice", "Water"],
-                    },
-                    {
-                        "name": "Dinner",
-                        "foods": ["Salmon", "Vegetables", "Sweet potato"],
-                    },
-                ],
-            }
-        return state
-
-    # -------- WORKOUT VALIDATION ----------
-    def validate_workout_plan(self, state: FitnessState) -> FitnessState:
-        try:
-            plan = state["workout_plan"]
-            validated_plan = {"schedule": plan.get("schedule", []), "exercises": []}
-            for ex in plan.get("exercises", []):
-                routines = []
-                for r in ex.get("routines", []):
-                    sets = int(r.get("sets", 1))
-                    reps = int(r.get("reps", 10))
-                    routines.append(
-                        {"name": r.get("name", "Exercise"), "sets": sets, "reps": reps}
-                    )
-                validated_plan["exercises"].append(
-                    {"day": ex.get("day", ""), "routines": routines}
-                )
-            state["validated_workout"] = validated_plan
-        except Exception as e:
-            state["errors"] = state.get("errors", []) + [
-                f"Workout validation error: {str(e)}"
-            ]
+        except (TypeError, ValueError, AttributeError, KeyError) as e:
+            state.setdefault("errors", []).append(f"Workout validation error: {e}")
         return state
 
     # -------- DIET VALIDATION ----------
-    def validate_diet_plan(self, state: FitnessState) -> FitnessState:
+    async def validate_diet_plan(self, state: FitnessState) -> FitnessState:
         try:
             plan = state.get("diet_plan", {})
             meals = plan.get("meals", [])
@@ -279,15 +316,20 @@ Dietary restrictions: {user.dietary_restrictions}
                 "dailyCalories": int(plan.get("dailyCalories", 2000)),
                 "meals": validated_meals,
             }
-        except Exception as e:
-            state["errors"] = state.get("errors", []) + [
-                f"Diet validation error: {str(e)}"
-            ]
+        except (TypeError, ValueError, AttributeError, KeyError) as e:
+            state.setdefault("errors", []).append(f"Diet validation error: {e}")
         return state
 
     # -------- MAIN ENTRY ----------
-    def generate_fitness_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_fitness_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
+            cache_key = hashlib.blake2b(
+                orjson.dumps(user_data, option=orjson.OPT_SORT_KEYS)
+            ).digest()
+            async with self._cache_lock:
+                cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
             user_profile = UserProfile(
                 user_id=user_data["user_id"],
                 age=int(user_data["age"]),
@@ -308,61 +350,25 @@ Dietary restrictions: {user.dietary_restrictions}
                 "final_plan": {},
                 "errors": [],
             }
-            result = self.graph.invoke(state)
+            result = await self._run_pipeline(state)
             final = result["final_plan"]
-            return {
+            plan = {
                 "success": final.get("success", False),
                 "workout_plan": final.get("workout_plan", {}),
                 "diet_plan": final.get("diet_plan", {}),
                 "errors": final.get("errors", []),
             }
+            # Only cache clean results so transient LLM failures expire
+            # with the request instead of being served for an hour.
+            if plan["success"]:
+                async with self._cache_lock:
+                    self._cache[cache_key] = plan
+            return plan
         except Exception as e:
-            return {"success": False, "error": f"LangGraph execution error: {str(e)}"}
+            # Broad safety net: whatever slips past the pipeline's own
+            # handlers must still come back as a structured error.
+            return {"success": False, "error": f"Pipeline execution error: {str(e)}"}
 
 
 # --------- GLOBAL INSTANCE ----------
 generator = FitnessPlanGenerator()
-
-
-# --------- OPTIONAL HTTP HANDLER ----------
-class handler(BaseHTTPRequestHandler):
-    def do_POST(self):
-        try:
-            length = int(self.headers.get("Content-Length", 0))
-            data = self.rfile.read(length)
-            request_data = json.loads(data.decode("utf-8"))
-            result = generator.generate_fitness_plan(request_data)
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode("utf-8"))
-        except Exception as e:
-            self.send_response(500)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(
-                json.dumps({"success": False, "error": str(e)}).encode("utf-8")
-            )
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
-        self.end_headers()
-
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.end_headers()
-        self.wfile.write(
-            json.dumps(
-                {
-                    "status": "healthy",
-                    "message": "Fitness Generator API with Groq/LangGraph",
-                }
-            ).encode("utf-8")
-        )
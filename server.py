@@ -1,13 +1,14 @@
 from typing import List
 
-from fastapi import FastAPI
+import msgspec
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 # ✅ Import the global generator instance from fitness_generator.py
 from fitness_generator import generator
-from pydantic import BaseModel
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 # CORS middleware (fully open)
 app.add_middleware(
     CORSMiddleware,
@@ -19,7 +20,7 @@ app.add_middleware(
 
 
 # Request schema
-class FitnessRequest(BaseModel):
+class FitnessRequest(msgspec.Struct):
     age: str
     weight: str
     height: str
@@ -31,23 +32,62 @@ class FitnessRequest(BaseModel):
     user_id: str
 
 
-@app.post("/api/fitness_generator")
-async def generate_plan(payload: FitnessRequest):
+async def parse_fitness_request(request: Request) -> FitnessRequest:
+    # msgspec fuses JSON decoding and validation into one C pass,
+    # which is substantially faster than Pydantic for bodies this size.
+    try:
+        return msgspec.json.decode(await request.body(), type=FitnessRequest)
+    except msgspec.DecodeError as e:
+        # ValidationError subclasses DecodeError, so malformed JSON and
+        # schema violations both come back as a 422 like Pydantic did.
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    # Release the pooled httpx client shared by the Groq LLM.
+    await generator._http.aclose()
+
+
+@app.post(
+    "/api/fitness_generator",
+    # The body is decoded by the dependency, so document it explicitly
+    # or it disappears from the OpenAPI schema.
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": msgspec.json.schema(FitnessRequest)}
+            },
+        }
+    },
+)
+async def generate_plan(payload: FitnessRequest = Depends(parse_fitness_request)):
     try:
         # Convert to dict for the generator
-        payload_dict = payload.dict()
+        payload_dict = msgspec.structs.asdict(payload)
 
         # Pass to generator and return result
-        result = generator.generate_fitness_plan(payload_dict)
+        result = await generator.generate_fitness_plan(payload_dict)
         return {"success": True, "data": result}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-@app.get("/")
+_ROOT_RESPONSE = {"message": "Fitness API is running."}
+
+
+@app.get("/", response_class=ORJSONResponse)
 def root():
-    return {"message": "Fitness API is running."}
-    return {"message": "Fitness API is running."}
-    return {"message": "Fitness API is running."}
-    return {"message": "Fitness API is running."}
+    return _ROOT_RESPONSE
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop + httptools: C-accelerated event loop and HTTP parser,
+    # noticeably faster than the default selector loop under async load.
+    uvicorn.run(
+        "server:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools"
+    )